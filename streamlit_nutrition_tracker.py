@@ -1,10 +1,15 @@
 import json
 import streamlit as st
+from collections import deque
 from datetime import datetime
+from functools import lru_cache
 import re
 import os
 import hashlib
+import heapq
+import hmac
 import secrets
+import sys
 
 # Page configuration
 st.set_page_config(
@@ -16,119 +21,310 @@ st.set_page_config(
 # ----------------------------
 # 1. Load food database
 # ----------------------------
-@st.cache_data
+COMPLEX_INDICATORS = [
+    ",", "(", ")", "with", "and", "or", 
+    "prepared", "canned", "packed", "packaged", "prepacked", "prepackaged",
+    "mix", "mixed", "salad", "soup", "sauce", "gravy", "broth", "stock",
+    "dish", "recipe", "meal", "dinner", "lunch", "breakfast",
+    "cooked", "boiled", "fried", "grilled", "roasted", "baked", "steamed",
+    "w/", "with", "au", "à la", "style", "flavored", "seasoned",
+    "sandwich", "burger", "pizza", "pasta", "stew", "curry", "stir-fry",
+    "casserole", "marinated", "breaded", "coated", "stuffed",
+    "meal", "dish", "plate", "serving", "portion"
+]
+# Any indicator as a plain substring, found in a single scan of the name
+COMPLEX_INDICATORS_RE = re.compile("|".join(re.escape(indicator) for indicator in COMPLEX_INDICATORS))
+
+MAIN_INGREDIENTS = ["chicken", "beef", "pork", "fish", "rice", "pasta", "potato", "vegetable", "fruit", "cheese"]
+
+def is_basic_ingredient(food):
+    """STRICT check if food is a basic ingredient"""
+    food_name = food["names"]["en"].lower()
+    
+    if COMPLEX_INDICATORS_RE.search(food_name):
+        return False
+    
+    found_count = 0
+    for ingredient in MAIN_INGREDIENTS:
+        if ingredient in food_name:
+            found_count += 1
+            if found_count > 1:
+                return False
+    
+    return True
+
+# Shared rather than copied: st.cache_data would unpickle the whole database
+# and its indexes on every rerun, and nothing mutates them after loading
+@st.cache_resource
 def load_food_database():
     """Load food database"""
     try:
         with open("ciqual_2020_foods.json", "r", encoding="utf-8") as f:
             foods = json.load(f)
         
-        search_index = {}
-        for food in foods:
-            name_key = food["names"]["en"].lower().strip()
-            search_index[name_key] = food
+        # Positions of each group's foods, in database order
+        group_index = {}
+        # Positions of basic foods by word of their name, in database order
+        token_index = {}
+        for i, food in enumerate(foods):
+            # Precompute per-food search fields once instead of on every query
+            food["_name_lower"] = food["names"]["en"].lower()
+            food["_name_padded"] = f" {food['_name_lower']} "
+            food["_is_basic"] = is_basic_ingredient(food)
+            
+            group_index.setdefault(food["group"], []).append(i)
+            if food["_is_basic"]:
+                for token in set(food["_name_lower"].split(" ")):
+                    token_index.setdefault(token, []).append(i)
             
-        return foods, search_index
+        return foods, group_index, token_index
     except FileNotFoundError:
         st.error("❌ Food database not found. Please make sure ciqual_2020_foods.json is uploaded.")
-        return [], {}
+        return [], {}, {}
 
 # Load foods
-foods, search_index = load_food_database()
+foods, group_index, token_index = load_food_database()
 
 # ----------------------------
 # 2. User management with PASSWORD PROTECTION
 # ----------------------------
 USERS_DIR = "user_data"
 
-def ensure_users_dir():
-    """Create user data directory if it doesn't exist"""
-    if not os.path.exists(USERS_DIR):
-        os.makedirs(USERS_DIR)
+# Log lists kept in append-only JSON Lines files next to the user file
+LOG_FILES = {"food_logs": "food", "water_logs": "water"}
+
+# Fields the views read from every entry of each log
+LOG_REQUIRED_KEYS = {
+    "food_logs": ("food", "grams", "nutrition", "timestamp"),
+    "water_logs": ("amount", "timestamp"),
+}
+
+# Create user data directory up front rather than before every load/save
+os.makedirs(USERS_DIR, exist_ok=True)
+
+@lru_cache(maxsize=256)
+def hash_username(username_lower):
+    """Hash a lowercased username into a short, filename-safe id"""
+    return hashlib.sha256(username_lower.encode()).hexdigest()[:16]
 
 def get_user_file(username):
     """Get the file path for a specific user's data"""
     # Create a safe filename from username (hash it for privacy)
-    username_hash = hashlib.sha256(username.lower().encode()).hexdigest()[:16]
-    return os.path.join(USERS_DIR, f"{username_hash}.json")
+    return os.path.join(USERS_DIR, f"{hash_username(username.lower())}.json")
+
+def get_user_log_file(username, log_name):
+    """Get the append-only file path for one of a user's log lists"""
+    user_file_base = os.path.splitext(get_user_file(username))[0]
+    return f"{user_file_base}.{LOG_FILES[log_name]}.jsonl"
+
+PASSWORD_HASH_ITERATIONS = 600_000
 
-def hash_password(password):
-    """Hash a password for storage"""
-    return hashlib.sha256(password.encode()).hexdigest()
+def hash_password(password, salt=None, iterations=PASSWORD_HASH_ITERATIONS):
+    """Hash a password for storage with salted PBKDF2"""
+    if salt is None:
+        salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations).hex()
+    return f"pbkdf2_sha256${iterations}${salt}${digest}"
+
+def check_password_hash(stored_hash, password):
+    """Check a password against a stored hash"""
+    if stored_hash.startswith("pbkdf2_sha256$"):
+        _, iterations, salt, _ = stored_hash.split("$")
+        candidate = hash_password(password, salt, int(iterations))
+    else:
+        # Accounts created before salting store a bare SHA-256 hex digest
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(stored_hash, candidate)
+
+def write_file_atomically(path, text):
+    """Replace a file's contents so readers only ever see the old or the new version"""
+    temp_file = f"{path}.tmp"
+    try:
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_file, path)
+    finally:
+        # Still there only if the write or the swap failed
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+def read_log_file(log_file):
+    """Read the entries of an append-only log file"""
+    entries = []
+    if os.path.exists(log_file):
+        # Undecodable bytes only spoil their own line, not the whole log
+        with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Skip a line torn by an interrupted append
+                    continue
+    return entries
+
+def is_valid_log_entry(log_name, entry):
+    """Check a log entry has the fields the app relies on"""
+    if not isinstance(entry, dict):
+        return False
+    if not all(key in entry for key in LOG_REQUIRED_KEYS[log_name]):
+        return False
+    if not isinstance(entry["timestamp"], str):
+        return False
+    # Amounts and nutrition values are summed, so they must be numbers
+    if log_name == "food_logs":
+        nutrition = entry["nutrition"]
+        if not isinstance(entry["food"], str) or not isinstance(nutrition, dict):
+            return False
+        return all(isinstance(nutrition.get(key), (int, float)) for key in NUTRIENTS)
+    return isinstance(entry["amount"], (int, float))
+
+def migrate_user_logs(username, user_data):
+    """Move logs embedded in a legacy user file into append-only log files"""
+    for log_name in LOG_FILES:
+        log_file = get_user_log_file(username, log_name)
+        # An earlier migration whose record save failed may have left a log
+        # file that has been appended to since, so merge instead of truncating
+        existing = read_log_file(log_file)
+        seen = {json.dumps(entry, sort_keys=True) for entry in existing}
+        embedded = [
+            entry for entry in user_data.get(log_name, [])
+            if json.dumps(entry, sort_keys=True) not in seen
+        ]
+        lines = [json.dumps(entry, ensure_ascii=False) + "\n" for entry in embedded + existing]
+        write_file_atomically(log_file, "".join(lines))
+    # Until the record is rewritten without its logs, the next load would migrate again
+    return save_user_data(username, user_data)
 
 def load_user_data(username):
     """Load data for a specific user"""
-    ensure_users_dir()
     user_file = get_user_file(username)
     
     try:
         if os.path.exists(user_file):
             with open(user_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except (json.JSONDecodeError, Exception) as e:
+                user_data = json.load(f)
+            
+            if not isinstance(user_data, dict):
+                st.warning("⚠️ Could not load user data: the user file is not a JSON object")
+                return None
+            
+            if any(log_name in user_data for log_name in LOG_FILES):
+                if not migrate_user_logs(username, user_data):
+                    return None
+            
+            for log_name in LOG_FILES:
+                # Skip malformed records rather than failing the whole load
+                user_data[log_name] = [
+                    entry for entry in read_log_file(get_user_log_file(username, log_name))
+                    if is_valid_log_entry(log_name, entry)
+                ]
+                # Entries written before the date field existed
+                for entry in user_data[log_name]:
+                    entry.setdefault("date", entry["timestamp"][:10])
+            # Repeated foods share one name string instead of a copy per entry
+            for entry in user_data["food_logs"]:
+                entry["food"] = sys.intern(entry["food"])
+            return user_data
+    # ValueError covers both JSONDecodeError and UnicodeDecodeError
+    except (ValueError, OSError) as e:
         st.warning(f"⚠️ Could not load user data: {e}")
     
     return None
 
 def save_user_data(username, user_data):
-    """Save data for a specific user"""
+    """Save auth and profile data for a specific user (logs are appended separately)"""
     try:
-        ensure_users_dir()
         user_file = get_user_file(username)
+        record = {key: value for key, value in user_data.items() if key not in LOG_FILES}
         
-        with open(user_file, "w", encoding="utf-8") as f:
-            json.dump(user_data, f, indent=2, ensure_ascii=False)
+        # A crash mid-write never leaves a truncated user record behind
+        write_file_atomically(user_file, json.dumps(record, separators=(",", ":"), ensure_ascii=False))
+        return True
+    except Exception as e:
+        st.error(f"❌ Error saving user data: {e}")
+        return False
+
+def append_user_log(username, log_name, entry):
+    """Append a single entry to one of a user's log files"""
+    try:
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with open(get_user_log_file(username, log_name), "a+b") as f:
+            # An interrupted append can leave a last line without its newline;
+            # end it first so the new entry isn't glued onto the torn line
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = "\n" + line
+            f.write(line.encode("utf-8"))
         return True
     except Exception as e:
         st.error(f"❌ Error saving user data: {e}")
         return False
 
-def verify_password(username, password):
-    """Verify a user's password"""
-    user_data = load_user_data(username)
+def verify_password(user_data, password):
+    """Verify a password against an already loaded user record"""
     if user_data and "auth" in user_data:
-        return user_data["auth"]["password_hash"] == hash_password(password)
+        return check_password_hash(user_data["auth"]["password_hash"], password)
     return False
 
 def create_new_user(username, password, profile_data):
-    """Create a new user with password protection"""
+    """Create a new user with password protection, returning their data (None on failure)"""
     user_data = {
         "auth": {
             "username": username,
             "password_hash": hash_password(password),
-            "created_at": datetime.now().isoformat()
+            # Same instant as the profile rather than a second clock read
+            "created_at": profile_data["created_at"]
         },
         "profile": profile_data,
         "food_logs": [],
         "water_logs": []
     }
     
-    return save_user_data(username, user_data)
+    if save_user_data(username, user_data):
+        return user_data
+    return None
 
 # ----------------------------
 # 3. Session State Management
 # ----------------------------
+# Only the last few logs are shown, so keep just those in the session
+RECENT_LOGS_SHOWN = 5
+
 # Initialize session state
-if 'current_user' not in st.session_state:
-    st.session_state.current_user = None
-    
-if 'user_data' not in st.session_state:
-    st.session_state.user_data = None
-    
-if 'show_login' not in st.session_state:
-    st.session_state.show_login = True
-    
-if 'show_create_user' not in st.session_state:
-    st.session_state.show_create_user = False
-    
-if 'recent_meal_logs' not in st.session_state:
-    st.session_state.recent_meal_logs = []
-    
-if 'meal_summary' not in st.session_state:
-    st.session_state.meal_summary = {"calories": 0, "protein": 0, "carbs": 0, "fat": 0}
+SESSION_DEFAULTS = {
+    "current_user": None,
+    "user_data": None,
+    "show_login": True,
+    "show_create_user": False,
+    "recent_meal_logs": deque(maxlen=RECENT_LOGS_SHOWN),
+    "meal_summary": {"calories": 0, "protein": 0, "carbs": 0, "fat": 0},
+    "recent_water_logs": deque(maxlen=RECENT_LOGS_SHOWN),
+    "food_logs_by_day": {},
+    "water_logs_by_day": {},
+    "targets": {},
+}
+for key, value in SESSION_DEFAULTS.items():
+    st.session_state.setdefault(key, value)
 
-if 'recent_water_logs' not in st.session_state:
-    st.session_state.recent_water_logs = []
+def group_logs_by_day(logs):
+    """Bucket log entries by their date"""
+    logs_by_day = {}
+    for log in logs:
+        logs_by_day.setdefault(log["date"], []).append(log)
+    return logs_by_day
+
+def start_user_session(username, user_data):
+    """Store the logged-in user and precompute their log stats once"""
+    st.session_state.current_user = username
+    st.session_state.user_data = user_data
+    # Day buckets turn every "today's logs" filter into a dict lookup
+    st.session_state.food_logs_by_day = group_logs_by_day(user_data["food_logs"])
+    st.session_state.water_logs_by_day = group_logs_by_day(user_data["water_logs"])
+    # Targets only depend on the profile, so compute them once per login
+    st.session_state.targets = calculate_targets(user_data["profile"])
 
 # ----------------------------
 # 4. Helper functions
@@ -159,15 +355,16 @@ def calculate_bmr(user):
     else:
         return 10 * weight + 6.25 * height - 5 * age - 161
 
+ACTIVITY_FACTORS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very active": 1.9
+}
+
 def calculate_tdee(user):
-    activity_factors = {
-        "sedentary": 1.2,
-        "light": 1.375,
-        "moderate": 1.55,
-        "active": 1.725,
-        "very active": 1.9
-    }
-    return calculate_bmr(user) * activity_factors[user["activity"]]
+    return calculate_bmr(user) * ACTIVITY_FACTORS[user["activity"]]
 
 def daily_calories(user):
     base = calculate_tdee(user)
@@ -181,44 +378,49 @@ def calculate_water_target(user):
     """Calculate daily water target based on weight (35ml per kg)"""
     return user["weight"] * 35
 
+def calculate_targets(user):
+    """Calculate all daily targets for a profile in one go"""
+    return {
+        "bmr": calculate_bmr(user),
+        "tdee": calculate_tdee(user),
+        "calories": daily_calories(user),
+        "protein": user["weight"] * 1.8,
+        "water": calculate_water_target(user),
+    }
+
+NUTRIENTS = ("calories", "protein", "carbs", "fat")
+
+def scale_nutrition(per_100g, grams):
+    """Scale per-100g nutrition values to a serving of the given weight"""
+    ratio = grams / 100
+    return {key: per_100g[key] * ratio for key in NUTRIENTS}
+
+def sum_nutrition(logs):
+    """Total calories and macros of food logs in a single pass"""
+    calories = protein = carbs = fat = 0
+    for log in logs:
+        nutrition = log["nutrition"]
+        calories += nutrition["calories"]
+        protein += nutrition["protein"]
+        carbs += nutrition["carbs"]
+        fat += nutrition["fat"]
+    return {"calories": calories, "protein": protein, "carbs": carbs, "fat": fat}
+
+def progress_percentage(total, target):
+    """Percentage of a daily target reached, capped at 100"""
+    if target <= 0:
+        return 0
+    return min(100, total / target * 100)
+
+COOKING_WORDS = ["grilled", "roasted", "baked", "steamed", "fried", "cooked", "boiled", "raw", "fresh"]
+COOKING_WORDS_RE = re.compile(r'\b(?:' + '|'.join(COOKING_WORDS) + r')\b')
+WHITESPACE_RE = re.compile(r'\s+')
+
+@lru_cache(maxsize=2048)
 def normalize_food_input(text):
     """Clean and normalize food input"""
-    COOKING_WORDS = ["grilled", "roasted", "baked", "steamed", "fried", "cooked", "boiled", "raw", "fresh"]
-    text = text.lower().strip()
-    for word in COOKING_WORDS:
-        text = re.sub(r'\b' + word + r'\b', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
-def is_basic_ingredient(food):
-    """STRICT check if food is a basic ingredient"""
-    food_name = food["names"]["en"].lower()
-    
-    complex_indicators = [
-        ",", "(", ")", "with", "and", "or", 
-        "prepared", "canned", "packed", "packaged", "prepacked", "prepackaged",
-        "mix", "mixed", "salad", "soup", "sauce", "gravy", "broth", "stock",
-        "dish", "recipe", "meal", "dinner", "lunch", "breakfast",
-        "cooked", "boiled", "fried", "grilled", "roasted", "baked", "steamed",
-        "w/", "with", "au", "à la", "style", "flavored", "seasoned",
-        "sandwich", "burger", "pizza", "pasta", "stew", "curry", "stir-fry",
-        "casserole", "marinated", "breaded", "coated", "stuffed",
-        "meal", "dish", "plate", "serving", "portion"
-    ]
-    
-    for indicator in complex_indicators:
-        if indicator in food_name:
-            return False
-    
-    main_ingredients = ["chicken", "beef", "pork", "fish", "rice", "pasta", "potato", "vegetable", "fruit", "cheese"]
-    found_count = 0
-    for ingredient in main_ingredients:
-        if ingredient in food_name:
-            found_count += 1
-            if found_count > 1:
-                return False
-    
-    return True
+    text = COOKING_WORDS_RE.sub('', text.lower().strip())
+    return WHITESPACE_RE.sub(' ', text).strip()
 
 def find_basic_ingredients(name, category_groups=None):
     """STRICT food matching that ONLY shows basic ingredients"""
@@ -227,86 +429,106 @@ def find_basic_ingredients(name, category_groups=None):
     if not name:
         return []
     
+    return search_basic_ingredients(name, category_groups)
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def search_basic_ingredients(name, category_groups):
+    """Search the food database for an already-normalized name (cached per name and groups)"""
     exact_basic_matches = []
     partial_basic_matches = []
     complex_matches = []
     
-    for food in foods:
-        if category_groups and food["group"] not in category_groups:
+    groups = set(category_groups) if category_groups else None
+    
+    # Whole-word match anywhere in the name (also covers prefix and suffix matches)
+    padded_name = f" {name} "
+    
+    # A basic match contains every query word, so only the basic foods
+    # listed under the query's rarest word need checking
+    postings = min((token_index.get(token, []) for token in name.split(" ")), key=len)
+    
+    for i in postings:
+        food = foods[i]
+        if groups is not None and food["group"] not in groups:
             continue
-            
-        food_name = food["names"]["en"].lower()
-        is_basic = is_basic_ingredient(food)
         
-        if name == food_name and is_basic:
+        if name == food["_name_lower"]:
             exact_basic_matches.append(food)
-        elif is_basic and (food_name.startswith(name + " ") or food_name.endswith(" " + name)):
-            partial_basic_matches.append(food)
-        elif is_basic and f" {name} " in f" {food_name} ":
+        elif padded_name in food["_name_padded"]:
             partial_basic_matches.append(food)
-        elif not exact_basic_matches and not partial_basic_matches:
-            if name in food_name:
-                complex_matches.append(food)
+    
+    # Rank partial matches by word-set Jaccard similarity to the query. Each
+    # one contains every query word, so this prefers names with fewer extra
+    # words; the stable sort keeps database order among ties
+    query_size = len(set(name.split(" ")))
+    partial_basic_matches.sort(key=lambda food: -query_size / len(set(food["_name_lower"].split(" "))))
     
     all_matches = exact_basic_matches + partial_basic_matches
     
     if all_matches:
         return all_matches[:5]
     
-    if complex_matches:
-        return complex_matches[:2]
+    # No basic match: fall back to plain substring matches
+    if groups is not None:
+        # Only visit the selected groups, merged back into database order
+        group_positions = [group_index.get(group, []) for group in groups]
+        candidates = (foods[i] for i in heapq.merge(*group_positions))
+    else:
+        candidates = foods
+    
+    for food in candidates:
+        if name in food["_name_lower"]:
+            complex_matches.append(food)
+            if len(complex_matches) == 2:
+                break
     
-    return []
+    return complex_matches
+
+# Food groups to search for each basic ingredient name
+BASIC_CATEGORIES = {
+    "chicken": ("meat, egg and fish",),
+    "beef": ("meat, egg and fish",),
+    "pork": ("meat, egg and fish",),
+    "lamb": ("meat, egg and fish",),
+    "turkey": ("meat, egg and fish",),
+    "duck": ("meat, egg and fish",),
+    "fish": ("meat, egg and fish",),
+    "salmon": ("meat, egg and fish",),
+    "tuna": ("meat, egg and fish",),
+    "cod": ("meat, egg and fish",),
+    "egg": ("dairy and eggs", "meat, egg and fish"),
+    "milk": ("dairy and eggs",),
+    "cheese": ("dairy and eggs",),
+    "yogurt": ("dairy and eggs",),
+    "butter": ("dairy and eggs",),
+    "cream": ("dairy and eggs",),
+    "rice": ("cereals and potatoes",),
+    "pasta": ("cereals and potatoes",),
+    "potato": ("cereals and potatoes",),
+    "bread": ("cereals and potatoes",),
+    "oat": ("cereals and potatoes",),
+    "wheat": ("cereals and potatoes",),
+    "flour": ("cereals and potatoes",),
+    "apple": ("fruits, vegetables, legumes and nuts",),
+    "banana": ("fruits, vegetables, legumes and nuts",),
+    "orange": ("fruits, vegetables, legumes and nuts",),
+    "berry": ("fruits, vegetables, legumes and nuts",),
+    "grape": ("fruits, vegetables, legumes and nuts",),
+    "mango": ("fruits, vegetables, legumes and nuts",),
+    "tomato": ("fruits, vegetables, legumes and nuts",),
+    "carrot": ("fruits, vegetables, legumes and nuts",),
+    "broccoli": ("fruits, vegetables, legumes and nuts",),
+    "spinach": ("fruits, vegetables, legumes and nuts",),
+    "lettuce": ("fruits, vegetables, legumes and nuts",),
+    "onion": ("fruits, vegetables, legumes and nuts",),
+    "pepper": ("fruits, vegetables, legumes and nuts",),
+    "cucumber": ("fruits, vegetables, legumes and nuts",),
+}
+DEFAULT_CATEGORIES = ("meat, egg and fish", "fruits, vegetables, legumes and nuts", "cereals and potatoes", "dairy and eggs")
 
 def detect_food_category(name):
     """Strict category detection for basic ingredients"""
-    name = name.lower()
-    
-    basic_categories = {
-        "chicken": ["meat, egg and fish"],
-        "beef": ["meat, egg and fish"], 
-        "pork": ["meat, egg and fish"],
-        "lamb": ["meat, egg and fish"],
-        "turkey": ["meat, egg and fish"],
-        "duck": ["meat, egg and fish"],
-        "fish": ["meat, egg and fish"],
-        "salmon": ["meat, egg and fish"],
-        "tuna": ["meat, egg and fish"],
-        "cod": ["meat, egg and fish"],
-        "egg": ["dairy and eggs", "meat, egg and fish"],
-        "milk": ["dairy and eggs"],
-        "cheese": ["dairy and eggs"],
-        "yogurt": ["dairy and eggs"],
-        "butter": ["dairy and eggs"],
-        "cream": ["dairy and eggs"],
-        "rice": ["cereals and potatoes"],
-        "pasta": ["cereals and potatoes"], 
-        "potato": ["cereals and potatoes"],
-        "bread": ["cereals and potatoes"],
-        "oat": ["cereals and potatoes"],
-        "wheat": ["cereals and potatoes"],
-        "flour": ["cereals and potatoes"],
-        "apple": ["fruits, vegetables, legumes and nuts"],
-        "banana": ["fruits, vegetables, legumes and nuts"],
-        "orange": ["fruits, vegetables, legumes and nuts"],
-        "berry": ["fruits, vegetables, legumes and nuts"],
-        "grape": ["fruits, vegetables, legumes and nuts"],
-        "mango": ["fruits, vegetables, legumes and nuts"],
-        "tomato": ["fruits, vegetables, legumes and nuts"],
-        "carrot": ["fruits, vegetables, legumes and nuts"],
-        "broccoli": ["fruits, vegetables, legumes and nuts"],
-        "spinach": ["fruits, vegetables, legumes and nuts"],
-        "lettuce": ["fruits, vegetables, legumes and nuts"],
-        "onion": ["fruits, vegetables, legumes and nuts"],
-        "pepper": ["fruits, vegetables, legumes and nuts"],
-        "cucumber": ["fruits, vegetables, legumes and nuts"],
-    }
-    
-    for basic_name, groups in basic_categories.items():
-        if basic_name == name:
-            return groups
-    
-    return ["meat, egg and fish", "fruits, vegetables, legumes and nuts", "cereals and potatoes", "dairy and eggs"]
+    return BASIC_CATEGORIES.get(name.lower(), DEFAULT_CATEGORIES)
 
 # ----------------------------
 # 5. Streamlit UI Components
@@ -328,9 +550,8 @@ def show_user_login():
         if login_button and username and password:
             with st.spinner("Verifying credentials..."):
                 user_data = load_user_data(username)
-                if user_data and verify_password(username, password):
-                    st.session_state.current_user = username
-                    st.session_state.user_data = user_data
+                if verify_password(user_data, password):
+                    start_user_session(username, user_data)
                     st.session_state.show_login = False
                     st.success(f"✨ Welcome back, {username}!")
                     st.rerun()
@@ -384,7 +605,7 @@ def show_user_creation():
                 return
             
             # Check if username already exists
-            if load_user_data(username) is not None:
+            if os.path.exists(get_user_file(username)):
                 st.error("❌ Username already exists. Please choose a different one.")
                 return
                 
@@ -405,9 +626,9 @@ def show_user_creation():
                     st.error(error)
             else:
                 # Create new user account
-                if create_new_user(username, password, user_profile):
-                    st.session_state.current_user = username
-                    st.session_state.user_data = load_user_data(username)
+                user_data = create_new_user(username, password, user_profile)
+                if user_data:
+                    start_user_session(username, user_data)
                     st.session_state.show_create_user = False
                     st.session_state.show_login = False
                     st.success(f"✨ Account created successfully! Welcome, {username}!")
@@ -416,13 +637,16 @@ def show_user_creation():
                 else:
                     st.error("❌ Failed to create account. Please try again.")
 
-def save_current_user_data():
-    """Save current user's data to file"""
-    if st.session_state.current_user and st.session_state.user_data:
-        return save_user_data(st.session_state.current_user, st.session_state.user_data)
+def save_current_user_log(log_name, entry):
+    """Append a new log entry to the current user's log file"""
+    if st.session_state.current_user:
+        return append_user_log(st.session_state.current_user, log_name, entry)
     return False
 
-def log_water_ui():
+# Fragments: typing and picking in these panels reruns only the panel,
+# while actual logs still trigger an app rerun to refresh the totals
+@st.fragment
+def log_water_ui(today):
     """Water logging interface"""
     if not st.session_state.current_user:
         st.warning("❌ Please login first.")
@@ -431,14 +655,11 @@ def log_water_ui():
     st.header("💧 Log Water")
     
     # Calculate water target and progress
-    user_profile = st.session_state.user_data["profile"]
-    water_target_ml = calculate_water_target(user_profile)
-    water_target_cups = round(water_target_ml / 240, 1)
+    water_target_ml = st.session_state.targets["water"]
     
-    today = datetime.now().strftime("%Y-%m-%d")
-    water_logs_today = [x for x in st.session_state.user_data.get("water_logs", []) if x["timestamp"].startswith(today)]
+    water_logs_today = st.session_state.water_logs_by_day.get(today, [])
     total_water_today = sum(x["amount"] for x in water_logs_today)
-    water_percentage = min(100, (total_water_today / water_target_ml) * 100)
+    water_percentage = progress_percentage(total_water_today, water_target_ml)
     
     # Show water progress
     st.subheader("📊 Hydration Progress")
@@ -456,12 +677,13 @@ def log_water_ui():
     # Show recent water logs
     if st.session_state.recent_water_logs:
         st.subheader("🕒 Recent Water Logs")
-        for log in st.session_state.recent_water_logs[-5:]:
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.write(f"💧 {log['amount']} ml")
-            with col2:
-                st.write(f"⏰ {log['timestamp'][11:16]}")
+        st.dataframe(
+            [
+                {"Amount (ml)": log["amount"], "Time": log["timestamp"][11:16]}
+                for log in st.session_state.recent_water_logs
+            ],
+            hide_index=True
+        )
     
     # Water logging interface
     st.subheader("➕ Log Water Intake")
@@ -497,25 +719,58 @@ def log_water_amount(amount):
     if not st.session_state.current_user:
         return
         
+    # One formatted timestamp per entry; the date is its prefix
+    timestamp = datetime.now().isoformat(timespec="seconds")
     water_log = {
         "amount": amount,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": timestamp,
+        "date": timestamp[:10]
     }
     
     # Add to user's water logs
     if "water_logs" not in st.session_state.user_data:
         st.session_state.user_data["water_logs"] = []
     st.session_state.user_data["water_logs"].append(water_log)
+    st.session_state.water_logs_by_day.setdefault(water_log["date"], []).append(water_log)
     
     # Update recent logs
     st.session_state.recent_water_logs.append(water_log)
     
     # Save user data
-    save_current_user_data()
+    save_current_user_log("water_logs", water_log)
     
     st.success(f"✅ Logged {amount} ml of water!")
     st.rerun()
 
+def log_food(food_name, food_id, grams, per_100g):
+    """Log a serving of food given its per-100g nutrition"""
+    if not st.session_state.current_user:
+        return
+        
+    serving_nutrition = scale_nutrition(per_100g, grams)
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    log_entry = {
+        "food": food_name,
+        "food_id": food_id,
+        "grams": grams,
+        "nutrition": {key: round(value, 1) for key, value in serving_nutrition.items()},
+        "timestamp": timestamp,
+        "date": timestamp[:10]
+    }
+    
+    # Add to user's logs
+    st.session_state.user_data["food_logs"].append(log_entry)
+    st.session_state.food_logs_by_day.setdefault(log_entry["date"], []).append(log_entry)
+    
+    # Update recent logs and summary
+    st.session_state.recent_meal_logs.append(log_entry)
+    for key, value in serving_nutrition.items():
+        st.session_state.meal_summary[key] += value
+    
+    # Save user data
+    save_current_user_log("food_logs", log_entry)
+
+@st.fragment
 def log_food_ui():
     """Food logging interface"""
     if not st.session_state.current_user:
@@ -527,16 +782,19 @@ def log_food_ui():
     # Show recent meal logs immediately
     if st.session_state.recent_meal_logs:
         st.subheader("📝 Recently Logged Foods")
-        for i, log in enumerate(st.session_state.recent_meal_logs[-5:]):  # Show last 5 items
-            col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
-            with col1:
-                st.write(f"**{log['food']}** ({log['grams']}g)")
-            with col2:
-                st.write(f"🔥 {log['nutrition']['calories']:.0f} cal")
-            with col3:
-                st.write(f"🥩 {log['nutrition']['protein']:.1f}g")
-            with col4:
-                st.write(f"⏰ {log['timestamp'][11:16]}")
+        st.dataframe(
+            [
+                {
+                    "Food": log["food"],
+                    "Grams": log["grams"],
+                    "Calories": round(log["nutrition"]["calories"]),
+                    "Protein (g)": log["nutrition"]["protein"],
+                    "Time": log["timestamp"][11:16],
+                }
+                for log in st.session_state.recent_meal_logs
+            ],
+            hide_index=True
+        )
         
         # Show meal summary
         if st.session_state.meal_summary["calories"] > 0:
@@ -583,7 +841,7 @@ def log_food_ui():
             # Create selection interface
             for idx, food in enumerate(matches):
                 nutrition = food["nutrition"]
-                is_basic = is_basic_ingredient(food)
+                is_basic = food["_is_basic"]
                 basic_indicator = "✅ BASIC" if is_basic else "⚠️ COMPLEX"
                 
                 col1, col2, col3 = st.columns([3, 2, 1])
@@ -595,40 +853,7 @@ def log_food_ui():
                     st.write(f"🥩 {nutrition['protein']}g protein")
                 with col3:
                     if st.button(f"Add", key=f"add_{idx}"):
-                        # Calculate nutrition for the serving size
-                        ratio = serving_size / 100
-                        cal = nutrition["calories"] * ratio
-                        pro = nutrition["protein"] * ratio
-                        carbs = nutrition["carbs"] * ratio
-                        fat = nutrition["fat"] * ratio
-                        
-                        # Create log entry
-                        log_entry = {
-                            "food": food["names"]["en"],
-                            "food_id": food["id"],
-                            "grams": serving_size,
-                            "nutrition": {
-                                "calories": round(cal, 1),
-                                "protein": round(pro, 1),
-                                "carbs": round(carbs, 1),
-                                "fat": round(fat, 1)
-                            },
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        
-                        # Add to user's logs
-                        st.session_state.user_data["food_logs"].append(log_entry)
-                        
-                        # Update recent logs and summary
-                        st.session_state.recent_meal_logs.append(log_entry)
-                        st.session_state.meal_summary["calories"] += cal
-                        st.session_state.meal_summary["protein"] += pro
-                        st.session_state.meal_summary["carbs"] += carbs
-                        st.session_state.meal_summary["fat"] += fat
-                        
-                        # Save user data
-                        save_current_user_data()
-                        
+                        log_food(food["names"]["en"], food["id"], serving_size, nutrition)
                         st.success(f"✅ Added {food['names']['en']} ({serving_size}g)")
                         st.rerun()
             
@@ -645,39 +870,7 @@ def log_food_ui():
                     manual_fat = st.number_input("Fat/100g", min_value=0.0, value=5.0, key="manual_fat")
                 
                 if st.button("Add Manual Entry"):
-                    ratio = serving_size / 100
-                    cal = manual_cal * ratio
-                    pro = manual_pro * ratio
-                    carbs = manual_carbs * ratio
-                    fat = manual_fat * ratio
-                    
-                    # Create log entry
-                    log_entry = {
-                        "food": f"{food_input} (manual)",
-                        "food_id": 0,
-                        "grams": serving_size,
-                        "nutrition": {
-                            "calories": round(cal, 1),
-                            "protein": round(pro, 1),
-                            "carbs": round(carbs, 1),
-                            "fat": round(fat, 1)
-                        },
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    
-                    # Add to user's logs
-                    st.session_state.user_data["food_logs"].append(log_entry)
-                    
-                    # Update recent logs and summary
-                    st.session_state.recent_meal_logs.append(log_entry)
-                    st.session_state.meal_summary["calories"] += cal
-                    st.session_state.meal_summary["protein"] += pro
-                    st.session_state.meal_summary["carbs"] += carbs
-                    st.session_state.meal_summary["fat"] += fat
-                    
-                    # Save user data
-                    save_current_user_data()
-                    
+                    log_food(f"{food_input} (manual)", 0, serving_size, {"calories": manual_cal, "protein": manual_pro, "carbs": manual_carbs, "fat": manual_fat})
                     st.success(f"✅ Added {food_input} ({serving_size}g) - Manual Entry")
                     st.rerun()
         
@@ -697,50 +890,18 @@ def log_food_ui():
                 manual_fat = st.number_input("Fat per 100g", min_value=0.0, value=5.0, key="manual_fat_fallback")
             
             if st.button("Add Food Manually"):
-                ratio = serving_size / 100
-                cal = manual_cal * ratio
-                pro = manual_pro * ratio
-                carbs = manual_carbs * ratio
-                fat = manual_fat * ratio
-                
-                # Create log entry
-                log_entry = {
-                    "food": f"{food_input} (manual)",
-                    "food_id": 0,
-                    "grams": serving_size,
-                    "nutrition": {
-                        "calories": round(cal, 1),
-                        "protein": round(pro, 1),
-                        "carbs": round(carbs, 1),
-                        "fat": round(fat, 1)
-                    },
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                # Add to user's logs
-                st.session_state.user_data["food_logs"].append(log_entry)
-                
-                # Update recent logs and summary
-                st.session_state.recent_meal_logs.append(log_entry)
-                st.session_state.meal_summary["calories"] += cal
-                st.session_state.meal_summary["protein"] += pro
-                st.session_state.meal_summary["carbs"] += carbs
-                st.session_state.meal_summary["fat"] += fat
-                
-                # Save user data
-                save_current_user_data()
-                
+                log_food(f"{food_input} (manual)", 0, serving_size, {"calories": manual_cal, "protein": manual_pro, "carbs": manual_carbs, "fat": manual_fat})
                 st.success(f"✅ Added {food_input} ({serving_size}g) - Manual Entry")
                 st.rerun()
     
     # Clear current meal button
     if st.session_state.recent_meal_logs:
         if st.button("🔄 Clear Current Meal", type="secondary"):
-            st.session_state.recent_meal_logs = []
+            st.session_state.recent_meal_logs.clear()
             st.session_state.meal_summary = {"calories": 0, "protein": 0, "carbs": 0, "fat": 0}
-            st.rerun()
+            st.rerun(scope="fragment")
 
-def show_daily_summary_ui():
+def show_daily_summary_ui(today):
     """Daily summary interface"""
     if not st.session_state.current_user:
         st.warning("❌ Please login first.")
@@ -749,32 +910,34 @@ def show_daily_summary_ui():
     st.header("📊 Daily Summary")
     
     # Calculate today's nutrition
-    user_data = st.session_state.user_data
-    today = datetime.now().strftime("%Y-%m-%d")
-    logs = [x for x in user_data["food_logs"] if x["timestamp"].startswith(today)]
-    water_logs = [x for x in user_data.get("water_logs", []) if x["timestamp"].startswith(today)]
+    logs = st.session_state.food_logs_by_day.get(today, [])
+    water_logs = st.session_state.water_logs_by_day.get(today, [])
     
     # Show food history
     if logs:
         st.subheader("📝 Today's Food Log")
-        for i, log in enumerate(logs):
-            with st.expander(f"{i+1}. {log['food']} ({log['grams']}g) - {log['timestamp'][11:16]}"):
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Calories", f"{log['nutrition']['calories']:.1f}")
-                with col2:
-                    st.metric("Protein", f"{log['nutrition']['protein']:.1f}g")
-                with col3:
-                    st.metric("Carbs", f"{log['nutrition']['carbs']:.1f}g")
-                with col4:
-                    st.metric("Fat", f"{log['nutrition']['fat']:.1f}g")
+        st.dataframe(
+            [
+                {
+                    "Time": log["timestamp"][11:16],
+                    "Food": log["food"],
+                    "Grams": log["grams"],
+                    "Calories": log["nutrition"]["calories"],
+                    "Protein (g)": log["nutrition"]["protein"],
+                    "Carbs (g)": log["nutrition"]["carbs"],
+                    "Fat (g)": log["nutrition"]["fat"],
+                }
+                for log in logs
+            ],
+            hide_index=True
+        )
     
     # Show water history
     if water_logs:
         st.subheader("💧 Today's Water Log")
         total_water = sum(x["amount"] for x in water_logs)
-        water_target = calculate_water_target(user_data["profile"])
-        water_percentage = min(100, (total_water / water_target) * 100)
+        water_target = st.session_state.targets["water"]
+        water_percentage = progress_percentage(total_water, water_target)
         
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -786,25 +949,24 @@ def show_daily_summary_ui():
         
         st.progress(water_percentage / 100)
         
-        for i, log in enumerate(water_logs):
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.write(f"💧 {log['amount']} ml")
-            with col2:
-                st.write(f"⏰ {log['timestamp'][11:16]}")
+        st.dataframe(
+            [{"Amount (ml)": log["amount"], "Time": log["timestamp"][11:16]} for log in water_logs],
+            hide_index=True
+        )
     
     if not logs and not water_logs:
         st.info("📊 No food or water logged today.")
         return
     
     # Calculate nutrition totals
-    total_cal = sum(x["nutrition"]["calories"] for x in logs)
-    total_pro = sum(x["nutrition"]["protein"] for x in logs)
-    total_carbs = sum(x["nutrition"]["carbs"] for x in logs)
-    total_fat = sum(x["nutrition"]["fat"] for x in logs)
-    
-    target_cal = daily_calories(user_data["profile"])
-    target_protein = user_data["profile"]["weight"] * 1.8
+    totals = sum_nutrition(logs)
+    total_cal = totals["calories"]
+    total_pro = totals["protein"]
+    total_carbs = totals["carbs"]
+    total_fat = totals["fat"]
+    
+    target_cal = st.session_state.targets["calories"]
+    target_protein = st.session_state.targets["protein"]
     remaining_calories = target_cal - total_cal
     
     # Display nutrition summary
@@ -821,7 +983,7 @@ def show_daily_summary_ui():
             st.metric("🥑 Fat", f"{total_fat:.1f}g")
         
         # Progress bar for calories
-        cal_percentage = min(100, (total_cal / target_cal) * 100) if target_cal > 0 else 0
+        cal_percentage = progress_percentage(total_cal, target_cal)
         st.progress(cal_percentage / 100)
         st.write(f"Calorie Progress: {cal_percentage:.1f}%")
     
@@ -840,10 +1002,8 @@ def show_daily_summary_ui():
         else:
             st.warning("• You've met your calorie target for today")
     
-    # Water recommendations
+    # Water recommendations (totals computed with the water history above)
     if water_logs:
-        total_water = sum(x["amount"] for x in water_logs)
-        water_target = calculate_water_target(user_data["profile"])
         if total_water < water_target * 0.7:
             st.warning("• Drink more water to meet your hydration goal")
         elif total_water >= water_target:
@@ -875,7 +1035,8 @@ def show_user_profile():
     # Show user history stats
     total_food_logs = len(user_data["food_logs"])
     total_water_logs = len(user_data.get("water_logs", []))
-    unique_days = len(set(log["timestamp"][:10] for log in user_data["food_logs"]))
+    # Each food day bucket is one tracked day
+    unique_days = len(st.session_state.food_logs_by_day)
     
     st.subheader("📊 History Stats")
     col1, col2, col3 = st.columns(3)
@@ -887,11 +1048,12 @@ def show_user_profile():
         st.metric("Days Tracked", unique_days)
     
     # Calculate and display targets
-    bmr = calculate_bmr(user_profile)
-    tdee = calculate_tdee(user_profile)
-    target_cal = daily_calories(user_profile)
-    target_protein = user_profile["weight"] * 1.8
-    water_target = calculate_water_target(user_profile)
+    targets = st.session_state.targets
+    bmr = targets["bmr"]
+    tdee = targets["tdee"]
+    target_cal = targets["calories"]
+    target_protein = targets["protein"]
+    water_target = targets["water"]
     
     st.subheader("🎯 Daily Targets")
     col1, col2, col3, col4 = st.columns(4)
@@ -933,28 +1095,32 @@ def main():
     st.sidebar.success(f"Logged in as: **{st.session_state.current_user}**")
     
     # Show quick stats in sidebar
+    # Resolve today's date once per run and hand it to the views
     today = datetime.now().strftime("%Y-%m-%d")
-    today_food_logs = [x for x in st.session_state.user_data["food_logs"] if x["timestamp"].startswith(today)]
-    today_water_logs = [x for x in st.session_state.user_data.get("water_logs", []) if x["timestamp"].startswith(today)]
-    
-    total_cal_today = sum(x["nutrition"]["calories"] for x in today_food_logs)
-    total_water_today = sum(x["amount"] for x in today_water_logs)
-    target_cal = daily_calories(st.session_state.user_data["profile"])
-    water_target = calculate_water_target(st.session_state.user_data["profile"])
+    today_food_logs = st.session_state.food_logs_by_day.get(today, [])
+    today_water_logs = st.session_state.water_logs_by_day.get(today, [])
     
     st.sidebar.subheader("📊 Today's Progress")
-    col1, col2 = st.columns(2)
-    with col1:
+    if today_food_logs or today_water_logs:
+        total_cal_today = sum(x["nutrition"]["calories"] for x in today_food_logs)
+        total_water_today = sum(x["amount"] for x in today_water_logs)
+        target_cal = st.session_state.targets["calories"]
+        water_target = st.session_state.targets["water"]
+        
         st.sidebar.metric("Calories", f"{total_cal_today:.0f}", f"{total_cal_today - target_cal:.0f}")
-    with col2:
         st.sidebar.metric("Water", f"{total_water_today} ml", f"{total_water_today - water_target:.0f}")
+    else:
+        st.sidebar.info("No logs yet today")
     
     # Logout button
     if st.sidebar.button("🚪 Logout", type="secondary"):
         st.session_state.current_user = None
         st.session_state.user_data = None
-        st.session_state.recent_meal_logs = []
-        st.session_state.recent_water_logs = []
+        st.session_state.recent_meal_logs.clear()
+        st.session_state.recent_water_logs.clear()
+        st.session_state.food_logs_by_day = {}
+        st.session_state.water_logs_by_day = {}
+        st.session_state.targets = {}
         st.session_state.meal_summary = {"calories": 0, "protein": 0, "carbs": 0, "fat": 0}
         st.session_state.show_login = True
         st.rerun()
@@ -967,6 +1133,10 @@ def main():
             try:
                 if os.path.exists(user_file):
                     os.remove(user_file)
+                    for log_name in LOG_FILES:
+                        log_file = get_user_log_file(st.session_state.current_user, log_name)
+                        if os.path.exists(log_file):
+                            os.remove(log_file)
                     st.session_state.current_user = None
                     st.session_state.user_data = None
                     st.session_state.show_login = True
@@ -975,17 +1145,16 @@ def main():
             except Exception as e:
                 st.error(f"❌ Error deleting account: {e}")
     
-    # Main app navigation
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Dashboard", "🍽️ Log Food", "💧 Log Water", "👤 Profile"])
-    
-    with tab1:
-        show_daily_summary_ui()
-    with tab2:
-        log_food_ui()
-    with tab3:
-        log_water_ui()
-    with tab4:
-        show_user_profile()
+    # Main app navigation: only the selected view runs, where tabs would
+    # execute all four on every rerun
+    views = {
+        "📊 Dashboard": lambda: show_daily_summary_ui(today),
+        "🍽️ Log Food": log_food_ui,
+        "💧 Log Water": lambda: log_water_ui(today),
+        "👤 Profile": show_user_profile,
+    }
+    selected_view = st.radio("Navigation", list(views), horizontal=True, label_visibility="collapsed", key="selected_view")
+    views[selected_view]()
 
 if __name__ == "__main__":
     main()